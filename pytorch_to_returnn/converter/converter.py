@@ -1,17 +1,20 @@
 
-
-import tensorflow as tf
+from __future__ import annotations
 import torch
 import numpy
 import types
-import tempfile
+import typing
+import contextlib
 from pytorch_to_returnn.pprint import pprint
 from typing import Callable, Optional, Dict, Any
-from returnn.tf.util.data import Data
-from pytorch_to_returnn import torch as torch_returnn
-from pytorch_to_returnn.import_wrapper import wrapped_import_torch_traced, wrapped_import_torch_returnn
-from pytorch_to_returnn.import_wrapper.torch_wrappers.tensor import WrappedTorchTensor
-from pytorch_to_returnn.naming import Naming
+
+if typing.TYPE_CHECKING:
+  # Note: TensorFlow, RETURNN and our wrappers (which import TF) are imported only when needed,
+  # to not have the TF startup cost just by importing this module.
+  import tensorflow as tf
+  from returnn.tf.util.data import Data
+  from returnn.tf.network import TFNetwork
+  from pytorch_to_returnn.naming import Naming
 
 
 ModelFuncType = Callable[[Optional[Callable[[str], types.ModuleType]], torch.Tensor], torch.Tensor]
@@ -53,22 +56,36 @@ class Converter:
                model_func: ModelFuncType, *,
                inputs: numpy.ndarray,
                inputs_data_kwargs: Optional[Dict[str, Any]] = None,
-               use_non_wrapped_reference: bool = True,
+               use_non_wrapped_reference: Optional[bool] = None,
                verify_with_torch: bool = True,
                verify_individual_model_io: bool = True,
                import_torch_params: bool = True,
                export_tf_checkpoint_save_path: Optional[str] = None,
                verify_returnn_standalone_model: bool = True,
                train: bool = False,
+               use_xla_jit: bool = False,
                ):
     """
     :param model_func:
       Gets an argument wrapped_import(str) -> module, or None. If None, should import as is.
       It also gets the inputs, converted to the right PyTorch `Tensor` object (either original or wrapped).
     :param inputs: example inputs
+    :param use_non_wrapped_reference: whether to run the model with the original imports (:func:`_run_reference`)
+      to get the reference output.
+      By default (None), this is only done when the traced Torch run (:func:`_run_traced_orig_torch`) is skipped,
+      as the traced run already provides the reference output.
+      Set it to True to also verify the traced run against the original PyTorch run.
+    :param use_xla_jit: marks the ops of the RETURNN networks for XLA compilation (see :func:`_tf_jit_scope`).
+      This can fuse the many small ops of e.g. RNNs, but can also change the results numerically slightly.
     """
     self._model_func = model_func
-    self._inputs_np = inputs
+    # Note: Every run gets its own copy of the inputs.
+    # The model might modify its inputs inplace (e.g. `x += ...`),
+    # and the Torch (and our wrapped) tensors share the memory with the given NumPy array.
+    # We need the unmodified inputs for the following runs and for the TF feed dict.
+    # Make it contiguous once here, such that the TF feed does not need to convert it in every run
+    # (the per-run copies via `.copy()` are C-contiguous anyway).
+    self._inputs_np = numpy.ascontiguousarray(inputs)
     inputs_data_kwargs = {} if inputs_data_kwargs is None else inputs_data_kwargs.copy()
     if "feature_dim_axis" not in inputs_data_kwargs and not inputs_data_kwargs.get("sparse", False):
       assert len(inputs.shape) >= 2  # (batch,feature|channel,...)
@@ -81,28 +98,60 @@ class Converter:
         inputs.shape[i] if i == inputs_data_kwargs["feature_dim_axis"] else None
         for i in range(1, len(inputs.shape))]
     self._returnn_in_data_dict = inputs_data_kwargs
-    self.use_non_wrapped_reference = use_non_wrapped_reference
     self.verify_with_torch = verify_with_torch
     self.verify_individual_model_io = verify_individual_model_io
     self.import_torch_params = import_torch_params
+    if use_non_wrapped_reference is None:
+      use_non_wrapped_reference = not (verify_with_torch or verify_individual_model_io or import_torch_params)
+    self.use_non_wrapped_reference = use_non_wrapped_reference
     self.export_tf_checkpoint_save_path = export_tf_checkpoint_save_path
     self.train = train
+    self.use_xla_jit = use_xla_jit
     self._tf_checkpoint_save_path = None  # type: Optional[str]
+    self._returnn_param_values = None  # type: Optional[Dict[str, numpy.ndarray]]  # TF var name -> value
     self.verify_returnn_standalone_model = verify_returnn_standalone_model
     self._out_ref_np = None  # type: Optional[numpy.ndarray]
-    self._torch_namespace = None  # type: Optional[Naming]
+    self._torch_namespace: Optional[Naming] = None
     self._out_returnn_np = None  # type: Optional[numpy.ndarray]
     self._returnn_net_dict = None  # type: Optional[Dict[str, Dict[str, Any]]]
+    self._tf_session = None  # type: Optional[tf.compat.v1.Session]
 
   def run(self):
     if self.use_non_wrapped_reference:
       self._run_reference()
     if self.verify_with_torch or self.verify_individual_model_io or self.import_torch_params:
       self._run_traced_orig_torch()
-    self._run_torch_returnn_drop_in()
-    if self.verify_returnn_standalone_model:
-      self._run_returnn_standalone_net_dict()
-      self._run_returnn_standalone_python()
+    import tensorflow as tf
+    # All RETURNN phases construct their networks in the same (default) TF graph,
+    # so we share a single session for them.
+    with tf.compat.v1.Session() as session:
+      self._tf_session = session
+      try:
+        self._run_torch_returnn_drop_in()
+        if self.verify_returnn_standalone_model:
+          self._run_returnn_standalone_net_dict()
+          self._run_returnn_standalone_python()
+      finally:
+        self._tf_session = None
+        self._returnn_param_values = None  # only needed for the standalone runs, can be big
+
+  def _get_tf_session(self) -> tf.compat.v1.Session:
+    """
+    :return: the TF session shared by all RETURNN phases, see :func:`run`
+    """
+    assert self._tf_session, "Call run() first."
+    return self._tf_session
+
+  def _tf_jit_scope(self):
+    """
+    :return: context manager for the construction of the RETURNN networks.
+      With :attr:`use_xla_jit`, the ops get explicitly marked for XLA compilation.
+      Unlike the global JIT level of the session config, this also applies on CPU.
+    """
+    if self.use_xla_jit:
+      import tensorflow as tf
+      return tf.xla.experimental.jit_scope()
+    return contextlib.nullcontext()
 
   @property
   def returnn_net_dict(self) -> Dict[str, Dict[str, Any]]:
@@ -118,6 +167,15 @@ class Converter:
       d[size] = [self._inputs_np.shape[input.get_batch_axis(i)]] * n_batch  # not so relevant
     return d
 
+  def _run_tf_output(self, session: tf.compat.v1.Session, *, x: Data, y: Data):
+    """
+    :return: (y, y seq lens), feeding our inputs into x.
+      This goes via `session.make_callable`, which resolves the feeds and fetches only once.
+    """
+    feed_dict = self._make_tf_feed_dict(x)
+    fn = session.make_callable((y.placeholder, y.size_placeholder), feed_list=list(feed_dict.keys()))
+    return fn(*feed_dict.values())
+
   def _run_reference(self):
     """
     The reference, using the original import.
@@ -134,7 +192,10 @@ class Converter:
     with torch.no_grad():
       out_ref = self._model_func(None, torch.from_numpy(self._inputs_np.copy()))
       assert isinstance(out_ref, torch.Tensor)
-      out_ref_np = out_ref.cpu().numpy()
+      out_ref = out_ref.detach()
+      if out_ref.device.type != "cpu":
+        out_ref = out_ref.cpu()
+      out_ref_np = out_ref.numpy()
     self._out_ref_np = out_ref_np
     print()
 
@@ -143,9 +204,13 @@ class Converter:
     Now with wrapped import. That will also use the original PyTorch code, but wrapped with our custom logic.
     This should not change anything, and still would use the PyTorch logic,
     except that the wrapped classes can collect additional information.
-    However, we still will check that we got the same output,
-    just to check that there is no subtle bug due to the wrapping logic.
+    With :attr:`use_non_wrapped_reference`, we still will check that we got the same output
+    as :func:`_run_reference`, just to check that there is no subtle bug due to the wrapping logic.
+    By default, this check is skipped, and the output here is used as the reference.
     """
+    from pytorch_to_returnn.import_wrapper import wrapped_import_torch_traced
+    from pytorch_to_returnn.import_wrapper.torch_wrappers.tensor import WrappedTorchTensor
+    from pytorch_to_returnn.naming import Naming
     print(">>> Running with wrapped imports, wrapping original PyTorch...")
     torch.manual_seed(42)
     numpy.random.seed(42)
@@ -167,17 +232,21 @@ class Converter:
         self._torch_namespace = naming
     if self._out_ref_np is not None:
       assert self._out_ref_np.shape == out_wrapped_np.shape
-      numpy.testing.assert_allclose(self._out_ref_np, out_wrapped_np)
+      _assert_allclose_chunked(self._out_ref_np, out_wrapped_np)
       print(">>>> Looks good!")
     else:
       self._out_ref_np = out_wrapped_np  # just use that as further reference
     print()
 
   def _run_torch_returnn_drop_in(self):
+    from returnn.tf.util.data import Data
+    from pytorch_to_returnn import torch as torch_returnn
+    from pytorch_to_returnn.import_wrapper import wrapped_import_torch_returnn
+    from pytorch_to_returnn.naming import Naming
     print(">>> Running with wrapped Torch import, wrapping replacement for PyTorch...")
     torch.manual_seed(42)
     numpy.random.seed(42)
-    with tf.compat.v1.Session() as session:
+    with self._get_tf_session().as_default() as session:
       with Naming.make_instance(
             wrap_to_returnn_enabled=True,
             returnn_train_flag=self.train,
@@ -188,7 +257,8 @@ class Converter:
         assert isinstance(in_returnn, torch_returnn.Tensor)
         x = naming.register_input(in_returnn, Data("data", **self._returnn_in_data_dict))
         print("RETURNN input:", x)
-        out_returnn = self._model_func(wrapped_import_torch_returnn, in_returnn)
+        with self._tf_jit_scope():
+          out_returnn = self._model_func(wrapped_import_torch_returnn, in_returnn)
         assert isinstance(out_returnn, torch_returnn.Tensor)
         out_returnn_ = naming.register_output(out_returnn)
         y, returnn_axis_from_torch_axis = out_returnn_.returnn_data, out_returnn_.returnn_axis_from_torch_axis
@@ -205,8 +275,7 @@ class Converter:
         print(">>>> Modules with params:")
         pprint(dict(torch_mods_with_params))
 
-      feed_dict = self._make_tf_feed_dict(x)
-      y_, y_size = session.run((y.placeholder, y.size_placeholder), feed_dict=feed_dict)
+      y_, y_size = self._run_tf_output(session, x=x, y=y)
       assert isinstance(y_, numpy.ndarray)
       self._out_returnn_np = y_
       print("Output shape:", y_.shape)
@@ -214,25 +283,49 @@ class Converter:
       y_torch = y_.transpose(*[returnn_axis_from_torch_axis[i] for i in range(y_.ndim)])
       print("Output shape (converted to Torch):", y_torch.shape)
       if self._out_ref_np is not None:
-        numpy.testing.assert_allclose(self._out_ref_np, y_torch, **naming.validate_allclose_kwargs)
+        _assert_allclose_chunked(self._out_ref_np, y_torch, **naming.validate_allclose_kwargs)
         print(">>>> Looks good!")
 
       if self.export_tf_checkpoint_save_path or self.verify_returnn_standalone_model:
         returnn_net = naming.root_namespace.returnn_ctx.network
         returnn_net.print_network_info(name="RETURNN network")
+        returnn_net.global_train_step.load(0, session=session)
         if self.export_tf_checkpoint_save_path:
           self._tf_checkpoint_save_path = self.export_tf_checkpoint_save_path
+          print(f"Saving TF checkpoint to {self._tf_checkpoint_save_path!r}...")
+          returnn_net.save_params_to_file(filename=self._tf_checkpoint_save_path, session=session)
         else:
-          tmp_dir = tempfile.mkdtemp("tmp-returnn-tf-checkpoint")
-          self._tf_checkpoint_save_path = tmp_dir + "/model"
-        print(f"Saving TF checkpoint to {self._tf_checkpoint_save_path!r}...")
-        returnn_net.global_train_step.load(0, session=session)
-        returnn_net.save_params_to_file(filename=self._tf_checkpoint_save_path, session=session)
+          # The standalone runs are in the same process, so we don't need a checkpoint on disk.
+          # They even reuse the same TF variables, but those are reset before loading (see _load_returnn_params),
+          # so loading these values is still verified.
+          print("Keeping TF params in memory...")
+          params = returnn_net.get_saveable_params_list()
+          self._returnn_param_values = {
+            param.op.name: value for param, value in zip(params, session.run(params))}
         print()
 
+  def _load_returnn_params(self, network: TFNetwork, session: tf.compat.v1.Session):
+    """
+    Loads the params saved by :func:`_run_torch_returnn_drop_in`,
+    either from the exported TF checkpoint, or from memory.
+
+    All RETURNN phases share the same TF graph and session (see :func:`run`),
+    so the standalone network reuses the TF variables of the drop-in network,
+    which still hold the drop-in values.
+    We reset them first, such that all values must really come from the load.
+    """
+    import tensorflow as tf
+    session.run(tf.compat.v1.variables_initializer(network.get_params_list()))
+    if self._tf_checkpoint_save_path:
+      network.load_params_from_file(filename=self._tf_checkpoint_save_path, session=session)
+      return
+    assert self._returnn_param_values is not None
+    for param in network.get_saveable_params_list():
+      param.load(self._returnn_param_values[param.op.name], session=session)
+
   def _run_returnn_standalone_net_dict(self):
-    print(">>> Constructing RETURNN model, load TF checkpoint, run...")
-    with tf.compat.v1.Session() as session:
+    print(">>> Constructing RETURNN model, load params, run...")
+    with self._get_tf_session().as_default() as session:
       from returnn.config import Config
       from returnn.tf.network import TFNetwork
       config = Config({
@@ -240,22 +333,25 @@ class Converter:
         "debug_print_layer_output_template": True,
       })
       network = TFNetwork(config=config, name="root", train_flag=self.train)
-      network.construct_from_dict(self._returnn_net_dict)
-      network.load_params_from_file(filename=self._tf_checkpoint_save_path, session=session)
+      with self._tf_jit_scope():
+        network.construct_from_dict(self._returnn_net_dict)
+      self._load_returnn_params(network, session=session)
 
       x = network.extern_data.get_default_input_data()
       y = network.get_default_output_layer().output
-      feed_dict = self._make_tf_feed_dict(x)
-      y_, y_size = session.run((y.placeholder, y.size_placeholder), feed_dict=feed_dict)
+      y_, y_size = self._run_tf_output(session, x=x, y=y)
       assert isinstance(y_, numpy.ndarray)
       print("Output shape:", y_.shape)
-      numpy.testing.assert_allclose(self._out_returnn_np, y_)
+      _assert_allclose_chunked(self._out_returnn_np, y_)
       print(">>>> Looks good!")
       print()
 
   def _run_returnn_standalone_python(self):
-    print(">>> Constructing RETURNN model via Python code, load TF checkpoint, run...")
-    with tf.compat.v1.Session() as session:
+    from pytorch_to_returnn import torch as torch_returnn
+    from pytorch_to_returnn.import_wrapper import wrapped_import_torch_returnn
+    from pytorch_to_returnn.naming import Naming
+    print(">>> Constructing RETURNN model via Python code, load params, run...")
+    with self._get_tf_session().as_default() as session:
       with Naming.make_instance() as naming:  # we expect this to work with the default settings
         model_func = self._model_func
 
@@ -279,16 +375,16 @@ class Converter:
         "debug_print_layer_output_template": True,
       })
       network = TFNetwork(config=config, name="root", train_flag=self.train)
-      network.construct_from_dict(net_dict)
-      network.load_params_from_file(filename=self._tf_checkpoint_save_path, session=session)
+      with self._tf_jit_scope():
+        network.construct_from_dict(net_dict)
+      self._load_returnn_params(network, session=session)
 
       x = network.extern_data.get_default_input_data()
       y = network.get_default_output_layer().output
-      feed_dict = self._make_tf_feed_dict(x)
-      y_, y_size = session.run((y.placeholder, y.size_placeholder), feed_dict=feed_dict)
+      y_, y_size = self._run_tf_output(session, x=x, y=y)
       assert isinstance(y_, numpy.ndarray)
       print("Output shape:", y_.shape)
-      numpy.testing.assert_allclose(self._out_returnn_np, y_)
+      _assert_allclose_chunked(self._out_returnn_np, y_)
       print(">>>> Looks good!")
       print()
 
@@ -312,3 +408,26 @@ def verify_torch_and_convert_to_returnn(
   converter = Converter(model_func=model_func, inputs=inputs, **kwargs)
   converter.run()
   return converter
+
+
+def _assert_allclose_chunked(actual: numpy.ndarray, desired: numpy.ndarray, *,
+                             rtol: float = 1e-7, atol: float = 0., num_chunks: int = 64):
+  """
+  Like :func:`numpy.testing.assert_allclose`, but compares the arrays chunk by chunk (along the biggest axis),
+  such that the temporary arrays of the comparison are only of the size of a chunk.
+  This matters for big outputs (e.g. generated audio).
+  The chunks are views, so this also works without a copy for non-contiguous arrays (e.g. transposed outputs).
+  Only in case of a mismatch, we call :func:`numpy.testing.assert_allclose` on the whole arrays,
+  to get the usual detailed error message.
+  """
+  assert actual.shape == desired.shape, f"shape mismatch: {actual.shape} vs {desired.shape}"
+  if actual.ndim == 0:
+    numpy.testing.assert_allclose(actual, desired, rtol=rtol, atol=atol)
+    return
+  axis = int(numpy.argmax(actual.shape))
+  chunk_size = max(-(-actual.shape[axis] // num_chunks), 1)  # ceil div
+  for start in range(0, actual.shape[axis], chunk_size):
+    idx = (slice(None),) * axis + (slice(start, start + chunk_size),)
+    if not numpy.allclose(actual[idx], desired[idx], rtol=rtol, atol=atol, equal_nan=True):
+      numpy.testing.assert_allclose(actual, desired, rtol=rtol, atol=atol)
+      raise AssertionError(f"not allclose, rtol={rtol}, atol={atol}")  # should have been raised above already
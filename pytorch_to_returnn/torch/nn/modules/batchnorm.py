@@ -130,6 +130,5 @@ class BatchNorm1d(_BatchNorm):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "BatchNorm1d",
+]
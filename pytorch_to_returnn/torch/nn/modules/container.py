@@ -145,6 +145,6 @@ class ModuleList(Module):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "ModuleList",
+  "Sequential",
+]
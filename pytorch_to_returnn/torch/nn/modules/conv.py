@@ -358,6 +358,11 @@ class FunctionalConvTransposed1d(_FunctionalConvNd):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "Conv1d",
+  "Conv2d",
+  "ConvTranspose1d",
+  "ConvTranspose2d",
+  "FunctionalConv1d",
+  "FunctionalConv2d",
+  "FunctionalConvTransposed1d",
+]
@@ -23,6 +23,5 @@ class Dropout(_DropoutNd):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "Dropout",
+]
@@ -124,6 +124,7 @@ class Matmul(Module):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "Identity",
+  "Linear",
+  "Matmul",
+]
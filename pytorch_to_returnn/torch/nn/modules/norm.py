@@ -21,6 +21,5 @@ class Norm(Module):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "Norm",
+]
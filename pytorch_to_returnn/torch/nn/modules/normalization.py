@@ -94,6 +94,6 @@ class GroupNorm(Module):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "GroupNorm",
+  "LayerNorm",
+]
@@ -464,6 +464,19 @@ def _unify_tensor_axes_returnn_meta(*inputs: Tensor) -> Tuple[Tensor, ...]:
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "BinaryOperator",
+  "Cast",
+  "Cat",
+  "ComparisonOperator",
+  "Copy",
+  "Gather",
+  "GetSublayer",
+  "Max",
+  "Reciprocal",
+  "ReturnnReinterpretSameSizeAs",
+  "ReturnnReinterpretSetAxes",
+  "Slice",
+  "Stack",
+  "Tile",
+  "Transpose",
+]
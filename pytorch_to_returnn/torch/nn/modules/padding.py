@@ -115,6 +115,8 @@ class ReplicationPad1d(_ReplicationPadNd):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "ConstantPad1d",
+  "GenericPadNd",
+  "ReflectionPad1d",
+  "ReplicationPad1d",
+]
@@ -44,6 +44,6 @@ class MaxPool2d(_MaxPoolNd):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "MaxPool1d",
+  "MaxPool2d",
+]
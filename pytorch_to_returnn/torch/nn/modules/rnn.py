@@ -1,8 +1,10 @@
 
 from __future__ import annotations
 import math
+import functools
 import warnings
 import numbers
+import numpy
 from typing import Dict, Any, Optional, List, Tuple, Union
 import tensorflow as tf
 from returnn.tf.layers.basic import LayerBase, SubnetworkLayer
@@ -18,9 +20,40 @@ class PackedSequence:  # dummy -- not yet implemented...
 
 
 def apply_permutation(tensor: Tensor, permutation: Tensor, dim: int = 1) -> Tensor:
+  if permutation.size(0) == tensor.size(dim) and _is_identity_permutation(permutation):
+    return tensor  # no-op, avoid the gather
   return tensor.index_select(dim, permutation)
 
 
+def _is_identity_permutation(permutation: Tensor) -> bool:
+  """
+  :return: whether the permutation is known to be [0, 1, ..., n-1].
+    This is only known for plain constants (e.g. via `from_numpy`).
+    The output of some layer is never treated as identity, even if it could be evaluated to a constant.
+  """
+  entry = permutation.returnn_naming_entry
+  if entry.is_input or entry.is_param or entry.output_from_calls:
+    return False
+  values = permutation.numpy()
+  return values.ndim == 1 and numpy.array_equal(values, numpy.arange(values.shape[0]))
+
+
+@functools.lru_cache(maxsize=None)
+def _weight_names(num_layers: int, num_directions: int, bias: bool) -> Tuple[Tuple[str, ...], ...]:
+  """
+  :return: for every layer and direction (in that order), the param names, e.g. ("weight_ih_l0", ...)
+  """
+  all_names = []
+  for layer in range(num_layers):
+    for direction in range(num_directions):
+      suffix = '_reverse' if direction == 1 else ''
+      names = ['weight_ih_l{}{}', 'weight_hh_l{}{}']
+      if bias:
+        names += ['bias_ih_l{}{}', 'bias_hh_l{}{}']
+      all_names.append(tuple(x.format(layer, suffix) for x in names))
+  return tuple(all_names)
+
+
 class RNNBase(Module):
 
   def __init__(self, mode: str, input_size: int, hidden_size: int,
@@ -58,28 +91,27 @@ class RNNBase(Module):
     else:
       raise ValueError("Unrecognized RNN mode: " + mode)
 
-    self._all_weights = []
+    weight_names = _weight_names(num_layers, num_directions, bias)
+    self._all_weights = [list(param_names) for param_names in weight_names]
+    param_shapes = []  # type: List[Tuple[str, Tuple[int, ...]]]  # (name, shape) for all params
     for layer in range(num_layers):
       for direction in range(num_directions):
         layer_input_size = input_size if layer == 0 else hidden_size * num_directions
 
-        w_ih = Parameter(Tensor(gate_size, layer_input_size))
-        w_hh = Parameter(Tensor(gate_size, hidden_size))
-        b_ih = Parameter(Tensor(gate_size))
         # Second bias vector included for CuDNN compatibility. Only one
         # bias vector is needed in standard definition.
-        b_hh = Parameter(Tensor(gate_size))
-        layer_params = (w_ih, w_hh, b_ih, b_hh)
+        layer_param_shapes = [(gate_size, layer_input_size), (gate_size, hidden_size), (gate_size,), (gate_size,)]
 
-        suffix = '_reverse' if direction == 1 else ''
-        param_names = ['weight_ih_l{}{}', 'weight_hh_l{}{}']
-        if bias:
-          param_names += ['bias_ih_l{}{}', 'bias_hh_l{}{}']
-        param_names = [x.format(layer, suffix) for x in param_names]
+        param_names = weight_names[layer * num_directions + direction]
+        param_shapes.extend(zip(param_names, layer_param_shapes))
 
-        for name, param in zip(param_names, layer_params):
-          setattr(self, name, param)
-        self._all_weights.append(param_names)
+    # Allocate a single flat buffer for all params, and let each param be a view into it.
+    flat_buffer = numpy.zeros((sum(int(numpy.prod(shape)) for _, shape in param_shapes),), dtype="float32")
+    offset = 0
+    for name, shape in param_shapes:
+      size = int(numpy.prod(shape))
+      setattr(self, name, Parameter(*shape, numpy_array=flat_buffer[offset:offset + size].reshape(shape)))
+      offset += size
 
     self.reset_parameters()
 
@@ -134,9 +166,6 @@ class RNNBase(Module):
     return {
       "class": "rec", "unit": self.mode, "from": self._get_input_layer_name(input), "n_out": self.hidden_size}
 
-  def import_params_torch_to_returnn(self, *, layer: LayerBase, torch_module):
-    pass  # TODO...
-
   def __setstate__(self, d):
     super(RNNBase, self).__setstate__(d)
     if 'all_weights' in d:
@@ -144,18 +173,9 @@ class RNNBase(Module):
 
     if isinstance(self._all_weights[0][0], str):
       return
-    num_layers = self.num_layers
     num_directions = 2 if self.bidirectional else 1
-    self._all_weights = []
-    for layer in range(num_layers):
-      for direction in range(num_directions):
-        suffix = '_reverse' if direction == 1 else ''
-        weights = ['weight_ih_l{}{}', 'weight_hh_l{}{}', 'bias_ih_l{}{}', 'bias_hh_l{}{}']
-        weights = [x.format(layer, suffix) for x in weights]
-        if self.bias:
-          self._all_weights += [weights]
-        else:
-          self._all_weights += [weights[:2]]
+    self._all_weights = [
+      list(param_names) for param_names in _weight_names(self.num_layers, num_directions, self.bias)]
 
   @property
   def all_weights(self) -> List[Parameter]:
@@ -183,6 +203,10 @@ class LSTM(RNNBase):
   def create_returnn_layer_dict(self, input: Tensor, hx: Optional[Tensor] = None) -> Dict[str, Any]:
     assert not self.bidirectional
     if self.num_layers > 1:
+      # Note: The RETURNN rec units (e.g. NativeLstm2) do not support multiple layers in a single layer,
+      # and a rec layer with a unit subnetwork over LSTM cells would loop over time in Python/TF ops,
+      # which is slower than one native LSTM kernel per layer.
+      # So we keep one "rec" layer per LSTM layer, wrapped in a subnetwork.
       input_layer_name = self._get_input_layer_name(input)  # call now, to have nicer order of "data"
       subnet_dict = {}
       for i in range(self.num_layers):
@@ -298,6 +322,9 @@ class GetLastHiddenState(Module):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "GetLastHiddenState",
+  "LSTM",
+  "PackedSequence",
+  "RNNBase",
+  "apply_permutation",
+]
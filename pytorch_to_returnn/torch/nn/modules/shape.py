@@ -324,6 +324,10 @@ class Split(Module):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "Flatten",
+  "MergeDims",
+  "Split",
+  "SplitDims",
+  "Squeeze",
+  "Unflatten",
+]
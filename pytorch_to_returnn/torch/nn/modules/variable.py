@@ -108,6 +108,6 @@ class Constant(Module):
 
 
 __all__ = [
-  key for (key, value) in sorted(globals().items())
-  if not key.startswith("_")
-  and getattr(value, "__module__", "") == __name__]
+  "Constant",
+  "Variable",
+]
@@ -53,7 +53,8 @@ def test_mnist():
   N, C, H, W = 64, 1, 28, 28
   x = rnd.normal(0., 1., (N, C, H, W)).astype("float32")
   verify_torch_and_convert_to_returnn(
-    model_func, inputs=x, inputs_data_kwargs={"shape": (C, H, W)})
+    model_func, inputs=x, inputs_data_kwargs={"shape": (C, H, W)},
+    use_non_wrapped_reference=True)  # also compare plain PyTorch against the traced wrapped PyTorch
 
 
 def test_weight_norm():
@@ -225,6 +226,49 @@ def test_naming_inner_func_functional_with_buffer():
   verify_torch_and_convert_to_returnn(model_func, inputs=x)
 
 
+def test_assert_allclose_chunked():
+  from pytorch_to_returnn.converter.converter import _assert_allclose_chunked
+
+  def _check_same_as_numpy(actual, desired, **kwargs):
+    try:
+      numpy.testing.assert_allclose(actual, desired, **kwargs)
+    except AssertionError:
+      expected_ok = False
+    else:
+      expected_ok = True
+    try:
+      _assert_allclose_chunked(actual, desired, **kwargs)
+    except AssertionError:
+      ok = False
+    else:
+      ok = True
+    assert ok == expected_ok, f"{actual!r} vs {desired!r}, {kwargs}: expected ok={expected_ok}"
+
+  rnd = numpy.random.RandomState(42)
+  x = rnd.normal(0., 1., (3, 5, 200)).astype("float32")
+  _check_same_as_numpy(x, x.copy())
+  y = x.copy()
+  y[2, 4, 199] += 1.
+  _check_same_as_numpy(x, y)
+  # NaN
+  x_nan, y_nan = x.copy(), x.copy()
+  x_nan[1, 2, 3] = y_nan[1, 2, 3] = numpy.nan
+  _check_same_as_numpy(x_nan, y_nan)
+  _check_same_as_numpy(x_nan, x)
+  _check_same_as_numpy(x, x_nan)
+  # atol/rtol
+  for rtol, atol in [(1e-7, 0.), (1e-3, 0.), (0., 1e-3), (1e-5, 1e-5)]:
+    for eps in [1e-6, 1e-4, 1e-2]:
+      _check_same_as_numpy(x, x + eps, rtol=rtol, atol=atol)
+      _check_same_as_numpy(x, x * (1. + eps), rtol=rtol, atol=atol)
+  # non-contiguous (e.g. transposed) arrays, and other shapes
+  _check_same_as_numpy(x.transpose(2, 0, 1), y.transpose(2, 0, 1))
+  _check_same_as_numpy(x.transpose(2, 0, 1), x.copy().transpose(2, 0, 1))
+  _check_same_as_numpy(numpy.array(1.), numpy.array(1.))
+  _check_same_as_numpy(numpy.array(1.), numpy.array(2.))
+  _check_same_as_numpy(numpy.zeros((0, 3)), numpy.zeros((0, 3)))
+
+
 if __name__ == "__main__":
   if len(sys.argv) <= 1:
     for k, v in sorted(globals().items()):
@@ -69,6 +69,61 @@ def test_base_get_output_shape_from_returnn_2d_reorder_dynamic():
     assert torch_shape == (64, 1, 11, 13)
 
 
+def test_rnn_all_weights():
+  import tensorflow as tf
+  from pytorch_to_returnn.torch.nn.utils.weight_norm import WeightNorm
+  with tf.compat.v1.Session(), Naming.make_instance():  # weight norm evaluates the weights
+    lstm = torch.nn.LSTM(3, 5)
+    all_weights = lstm.all_weights
+    assert all_weights[0][0] is lstm.weight_ih_l0
+    # setattr
+    p = torch.nn.Parameter(torch.Tensor(20, 3))
+    lstm.weight_ih_l0 = p
+    assert lstm.all_weights[0][0] is p
+    # register_parameter
+    p = torch.nn.Parameter(torch.Tensor(20, 5))
+    lstm.register_parameter("weight_hh_l0", p)
+    assert lstm.all_weights[0][1] is p
+    # weight norm: direct del of the param and register_parameter, then setattr of a non-param tensor
+    weight_norm = WeightNorm.apply(lstm, "weight_ih_l0", 0)
+    assert not isinstance(lstm.weight_ih_l0, torch.nn.Parameter)
+    assert lstm.all_weights[0][0] is lstm.weight_ih_l0
+    # and remove it again: delattr, then setattr of a new param
+    weight_norm.remove(lstm)
+    assert isinstance(lstm.weight_ih_l0, torch.nn.Parameter)
+    assert lstm.all_weights[0][0] is lstm.weight_ih_l0
+    # delattr
+    del lstm.bias_hh_l0
+    try:
+      lstm.all_weights
+    except AttributeError:
+      pass  # expected, must not return the removed param
+    else:
+      raise Exception("all_weights should not find bias_hh_l0 anymore")
+
+
+def test_rnn_apply_permutation():
+  import tensorflow as tf
+  from unittest import mock
+  from pytorch_to_returnn.torch.nn.modules.rnn import apply_permutation
+  with tf.compat.v1.Session(), Naming.make_instance():  # the binary op below evaluates its const inputs
+    hx = torch.zeros(1, 3, 5)
+    # Tensor.index_select is not implemented yet, so we only check that it would be used.
+    with mock.patch.object(torch.Tensor, "index_select", create=True) as index_select:
+      # identity const permutation
+      assert apply_permutation(hx, torch.from_numpy(numpy.array([0, 1, 2]))) is hx
+      assert index_select.call_count == 0
+      # non-identity const permutation
+      perm = torch.from_numpy(numpy.array([0, 2, 1]))
+      assert apply_permutation(hx, perm) is index_select.return_value
+      index_select.assert_called_once_with(1, perm)
+      # layer output, even if its values are [0, 1, 2]
+      perm = torch.from_numpy(numpy.array([0, 1, 2])) + 0
+      assert perm.returnn_naming_entry.output_from_calls
+      assert apply_permutation(hx, perm) is index_select.return_value
+      assert index_select.call_count == 2
+
+
 if __name__ == "__main__":
   if len(sys.argv) <= 1:
     for k, v in sorted(globals().items()):